@@ -1,10 +1,23 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-import os
-import google.generativeai as genai
-from typing import List, Dict
-import logging
-from run_cloud import run_terraform
+import startup
+
+with startup.phase("import flask"):
+    from flask import Flask, request, jsonify
+    from flask_cors import CORS
+
+with startup.phase("import app modules"):
+    import os
+    from typing import List, Dict
+    import logging
+    from run_cloud import run_terraform, run_terraform_parallel, run_terraform_incremental
+    from terraform_blocks import strip_language_marker
+    from batch import validate_resource_specs, generate_merged_script
+    from tenants import issue_tenant_token, tenant_from_token
+    import llm
+    from cache import get_cache
+
+# Fast cold start mode (for scale-to-zero deployments): bind the port first and
+# import/configure Gemini in the background instead of at module load
+FAST_COLD_START = os.environ.get("FAST_COLD_START", "0") == "1"
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -15,8 +28,32 @@ app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
 # Configure Gemini
-genai.configure(api_key="ADD IT")
-model = genai.GenerativeModel("gemini-pro")
+llm.configure(api_key="ADD IT")
+if FAST_COLD_START:
+    startup.warm_in_background(llm.warm_up)
+else:
+    llm.warm_up()
+    startup.mark_ready()
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness endpoint: 200 once the Gemini client is warm, 503 while still warming up"""
+    if startup.is_ready():
+        return jsonify({'ready': True})
+    return jsonify({'ready': False}), 503
+
+@app.route('/startup_report', methods=['GET'])
+def startup_report():
+    """Endpoint to get the boot time breakdown by import phase"""
+    return jsonify(startup.report())
+
+@app.route('/tenants', methods=['POST'])
+def create_tenant():
+    """Endpoint to create a tenant with a persistent Terraform workspace"""
+    try:
+        return jsonify({'tenant_token': issue_tenant_token()})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 503
 
 @app.route('/get_info', methods=['GET'])
 def get_info():
@@ -57,16 +94,28 @@ def generate_script():
         if not all(isinstance(x, str) for x in [resource_type] + answers):
             return jsonify({'error': 'All answers must be strings'}), 400
 
+        # Tenants with a persistent workspace only re-plan and re-apply what changed since
+        # their last submission. The tenant comes from a server-signed token, not a free-form id
+        tenant_token = data.get('tenant_token') or request.headers.get('X-Tenant-Token')
+        tenant_id = None
+        if tenant_token:
+            try:
+                tenant_id = tenant_from_token(tenant_token)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 403
+
         # Generate the Terraform script
         script = generate_terraform_script_from_answers(resource_type, answers, questions)
         
         # Clean up the script if it contains HCL marker
-        if script and "hcl" in script.splitlines()[0]:
-            script = "\n".join(script.splitlines()[1:])
+        script = strip_language_marker(script)
 
         # Run Terraform (optional - comment out if not needed)
         try:
-            terraform_output = run_terraform(script)
+            if tenant_id:
+                terraform_output = run_terraform_incremental(script, tenant_id)
+            else:
+                terraform_output = run_terraform(script)
             return jsonify({
                 'script': script,
                 'terraform_output': terraform_output
@@ -82,36 +131,84 @@ def generate_script():
         logger.error(f"Error in generate_script: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/generate_batch_script', methods=['POST'])
+def generate_batch_script():
+    """Endpoint to generate and apply one Terraform script for several resources"""
+    try:
+        if not request.is_json:
+            return jsonify({'error': 'Content-Type must be application/json'}), 400
+
+        data = request.get_json()
+        logger.debug(f"Received batch data: {data}")
+
+        resources = data.get('resources')
+        parallelism = data.get('parallelism')
+
+        # Validate every resource spec before starting any LLM call
+        try:
+            validate_resource_specs(resources)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if parallelism is not None and (not isinstance(parallelism, int) or parallelism < 1):
+            return jsonify({'error': 'parallelism must be a positive integer'}), 400
+
+        # Fragments are generated concurrently, so the batch takes about as long as the slowest one
+        script = generate_merged_script(generate_terraform_script_from_answers, resources)
+
+        # Independent parts of the merged configuration are applied concurrently
+        try:
+            terraform_output = run_terraform_parallel(script, parallelism=parallelism)
+            return jsonify({
+                'script': script,
+                'terraform_output': terraform_output
+            })
+        except Exception as terraform_error:
+            logger.error(f"Terraform execution error: {terraform_error}")
+            return jsonify({
+                'script': script,
+                'terraform_error': str(terraform_error)
+            })
+
+    except Exception as e:
+        logger.error(f"Error in generate_batch_script: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 def get_required_information(resource_type: str) -> List[str]:
     """Get required questions for a resource type"""
     try:
-        chat = model.start_chat(history=[
-            {
-                "role": "user",
-                "parts": ["You are an AI assistant that helps users create the most basic Terraform Infrastructure as Code scripts for cloud resource provisioning. Given a cloud resource type, return ONLY a list of questions (always including the access key, specific key, and region associated to the user's account) that need to be answered to create the most basic version of the Terraform configuration, with no additional text."]
-            },
-            {
-                "role": "model",
-                "parts": ["I will provide only the necessary questions (always including the access key, specific key, and region associated to the user's account) for the most basic Terraform cloud infrastructure configuration when given a resource type. Please provide the resource type."]
-            }
-        ])
-        
-        response = chat.send_message(f"What information is needed to create the most basic Terraform Infrastructure as Code configuration for {resource_type}? Return ONLY the questions (always including access key, secret key, and region), one per line, with no additional text.")
-        
-        seen = set()
-        questions = []
-        for q in [q.strip() for q in response.text.split('\n') if q.strip()]:
-            if q not in seen:
-                seen.add(q)
-                questions.append(q)
-        
-        questions.append("Do you have any additional specifications or requirements? (Type 'none' if none)")
-        return questions
-
+        # Questions only depend on the resource type, so they are generated once per node and
+        # shared by every worker; callers missing the same key wait for the first one
+        cache_key = f"questions:{resource_type.strip().lower()}"
+        return get_cache().get_or_set(cache_key, lambda: ask_required_questions(resource_type))
     except Exception as e:
         logger.error(f"Error getting questions: {str(e)}")
         return []
 
+def ask_required_questions(resource_type: str) -> List[str]:
+    """Ask the LLM for the questions needed for a resource type"""
+    history = [
+        {
+            "role": "user",
+            "parts": ["You are an AI assistant that helps users create the most basic Terraform Infrastructure as Code scripts for cloud resource provisioning. Given a cloud resource type, return ONLY a list of questions (always including the access key, specific key, and region associated to the user's account) that need to be answered to create the most basic version of the Terraform configuration, with no additional text."]
+        },
+        {
+            "role": "model",
+            "parts": ["I will provide only the necessary questions (always including the access key, specific key, and region associated to the user's account) for the most basic Terraform cloud infrastructure configuration when given a resource type. Please provide the resource type."]
+        }
+    ]
+    
+    response_text = llm.send_message(llm.QUESTION_MODELS, history, f"What information is needed to create the most basic Terraform Infrastructure as Code configuration for {resource_type}? Return ONLY the questions (always including access key, secret key, and region), one per line, with no additional text.")
+    
+    seen = set()
+    questions = []
+    for q in [q.strip() for q in response_text.split('\n') if q.strip()]:
+        if q not in seen:
+            seen.add(q)
+            questions.append(q)
+    
+    questions.append("Do you have any additional specifications or requirements? (Type 'none' if none)")
+    return questions
+
 def generate_terraform_script_from_answers(resource_type: str, answers: List[str], questions: List[str]) -> str:
     """Generate Terraform script from answers"""
     try:
@@ -124,7 +221,7 @@ def generate_terraform_script_from_answers(resource_type: str, answers: List[str
         
         qa_text = "\n".join(qa_pairs)
         
-        chat = model.start_chat(history=[
+        history = [
             {
                 "role": "user",
                 "parts": ["You are an AI assistant that helps users create the most basic Terraform Infrastructure as Code scripts for cloud resource provisioning. Given a cloud resource type, return ONLY a list of questions (always including access key, secret key, and region) that need to be answered to create the most basic version of the Terraform configuration, with no additional text."]
@@ -133,7 +230,7 @@ def generate_terraform_script_from_answers(resource_type: str, answers: List[str
                 "role": "model",
                 "parts": ["I will provide only the necessary questions (including access key, secret key, and region) for the most basic Terraform cloud infrastructure configuration when given a resource type. Please provide the resource type."]
             }
-        ])
+        ]
         
         prompt = f"""
                 Please generate the most basic Terraform Infrastructure as Code script for the following cloud resource:
@@ -146,8 +243,7 @@ def generate_terraform_script_from_answers(resource_type: str, answers: List[str
                 Generate only the Terraform configuration code using HashiCorp's HCL syntax. Include provider configuration and resource blocks as needed.
                 """
         
-        response = chat.send_message(prompt)
-        script_text = response.text
+        script_text = llm.send_message(llm.SCRIPT_MODELS, history, prompt)
         
         if "```" in script_text:
             script_text = script_text.split("```")[1]
@@ -0,0 +1,51 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+from terraform_blocks import merge_scripts
+
+# Upper bound on resources per batch request, and on concurrent LLM calls per batch
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "10"))
+MAX_BATCH_WORKERS = int(os.environ.get("MAX_BATCH_WORKERS", "8"))
+
+
+def validate_resource_specs(resource_specs: List[Dict]):
+    """Raise a ValueError describing the first problem with a list of resource specs"""
+    if not isinstance(resource_specs, list) or not resource_specs:
+        raise ValueError("resources must be a non-empty list")
+    if len(resource_specs) > MAX_BATCH_SIZE:
+        raise ValueError(f"At most {MAX_BATCH_SIZE} resources can be generated in one batch")
+
+    for i, spec in enumerate(resource_specs):
+        if not isinstance(spec, dict):
+            raise ValueError(f"Resource {i} must be an object")
+        for field in ['resource_type', 'questions', 'answers']:
+            if field not in spec:
+                raise ValueError(f"Missing required field in resource {i}: {field}")
+        if not isinstance(spec['questions'], list) or not isinstance(spec['answers'], list):
+            raise ValueError(f"questions and answers must be lists (resource {i})")
+        if not all(isinstance(x, str) for x in [spec['resource_type']] + spec['questions'] + spec['answers']):
+            raise ValueError(f"All answers must be strings (resource {i})")
+        if not spec['answers'] or len(spec['questions']) != len(spec['answers']):
+            raise ValueError(f"Number of answers ({len(spec['answers'])}) doesn't match number of questions ({len(spec['questions'])}) for resource {i}")
+
+
+def generate_merged_script(generate: Callable[[str, List[str], List[str]], str], resource_specs: List[Dict],
+                           max_workers: int = None) -> str:
+    """
+    Generate the Terraform fragment of every resource spec with concurrent calls to
+    generate(resource_type, answers, questions), then merge them into one script.
+    """
+    validate_resource_specs(resource_specs)
+
+    workers = min(max_workers or MAX_BATCH_WORKERS, MAX_BATCH_WORKERS, len(resource_specs))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        scripts = list(executor.map(
+            lambda spec: generate(spec['resource_type'], spec['answers'], spec['questions']),
+            resource_specs
+        ))
+
+    failed = [spec['resource_type'] for spec, script in zip(resource_specs, scripts) if script.startswith("Error")]
+    if failed:
+        raise ValueError(f"Failed to generate scripts for: {', '.join(failed)}")
+
+    return merge_scripts(scripts)
@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import zlib
+import fcntl
+import sqlite3
+import hashlib
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Backend selection: "sqlite" (shared by every worker process on the node), "memory" or "none"
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "sqlite")
+CACHE_PATH = os.environ.get("CACHE_PATH", "/tmp/makecloud-cache.sqlite3")
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL = float(os.environ.get("CACHE_TTL", str(24 * 60 * 60)))
+
+# Reads only refresh an entry's last-access time when it is older than this (seconds)
+ACCESS_UPDATE_INTERVAL = 60
+
+# Number of single-flight locks keys are hashed onto
+LOCK_STRIPES = 64
+
+
+def _stripe(key: str) -> int:
+    return int(hashlib.sha1(key.encode("utf-8")).hexdigest(), 16) % LOCK_STRIPES
+
+
+def _serialize(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+
+
+def _deserialize(data: bytes) -> Any:
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+class CacheBackend(ABC):
+    """Key/value cache storage. Values must be JSON serializable."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None on a miss (cache errors count as misses)"""
+
+    @abstractmethod
+    def set(self, key: str, value: Any):
+        """Store a value; cache errors are logged and ignored"""
+
+    @abstractmethod
+    def _single_flight(self, key: str):
+        """Context manager held while computing key, so only one caller computes it at a time"""
+
+    def get_or_set(self, key: str, compute: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for key, computing and storing it on a miss.
+        Callers that miss the same key at the same time wait for the first one
+        to compute it instead of computing it again (single-flight).
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._single_flight(key):
+            value = self.get(key)
+            if value is not None:
+                return value
+            value = compute()
+            self.set(key, value)
+            return value
+
+
+class NullCache(CacheBackend):
+    """Cache that stores nothing (CACHE_BACKEND=none)"""
+
+    def get(self, key: str) -> Optional[Any]:
+        return None
+
+    def set(self, key: str, value: Any):
+        pass
+
+    def _single_flight(self, key: str):
+        return nullcontext()
+
+
+class MemoryCache(CacheBackend):
+    """Per-process LRU cache, bounded by the serialized size of its entries"""
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, ttl: float = CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires, data)
+        self._size = 0
+        self._lock = threading.Lock()
+        self._key_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return _deserialize(entry[1])
+
+    def set(self, key: str, value: Any):
+        data = _serialize(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time() + self.ttl, data)
+            self._size += len(data)
+            while self._size > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+
+    def _single_flight(self, key: str):
+        return self._key_locks[_stripe(key)]
+
+    def _remove(self, key: str):
+        _, data = self._entries.pop(key)
+        self._size -= len(data)
+
+
+class SQLiteCache(CacheBackend):
+    """
+    On-disk cache shared by all worker processes on a node.
+    Uses WAL mode and a memory-mapped database file so reads don't block each
+    other; the last-access time used for LRU eviction is only written when it is
+    more than ACCESS_UPDATE_INTERVAL old. Entries are compressed JSON, evicted
+    once the total size goes over max_bytes. Single-flight across processes uses
+    flock on a striped set of lock files next to the database, which the OS
+    releases if the computing process dies.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES, ttl: float = CACHE_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={self.max_bytes * 2}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "expires REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            conn = self._connection()
+            now = time.time()
+            row = conn.execute("SELECT value, accessed FROM entries WHERE key = ? AND expires > ?", (key, now)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > ACCESS_UPDATE_INTERVAL:
+                conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            return _deserialize(row[0])
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Cache get failed for {key}, treating as a miss: {str(e)}")
+            return None
+
+    def set(self, key: str, value: Any):
+        data = _serialize(value)
+        try:
+            conn = self._connection()
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM entries WHERE expires <= ?", (now,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (key, data, len(data), now + self.ttl, now)
+                )
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+                if total > self.max_bytes:
+                    rows = conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall()
+                    for old_key, size in rows:
+                        if total <= self.max_bytes:
+                            break
+                        conn.execute("DELETE FROM entries WHERE key = ?", (old_key,))
+                        total -= size
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Cache set failed for {key}: {str(e)}")
+
+    @contextmanager
+    def _single_flight(self, key: str):
+        try:
+            lock_dir = f"{self.path}.locks"
+            os.makedirs(lock_dir, exist_ok=True)
+            lock_file = open(os.path.join(lock_dir, f"{_stripe(key)}.lock"), "a")
+        except OSError as e:
+            logger.warning(f"Cache lock unavailable for {key}, computing without it: {str(e)}")
+            yield
+            return
+        with lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> CacheBackend:
+    """Return the process-wide cache, using the backend chosen by CACHE_BACKEND"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            if CACHE_BACKEND == "sqlite":
+                _cache = SQLiteCache()
+            elif CACHE_BACKEND == "memory":
+                _cache = MemoryCache()
+            elif CACHE_BACKEND == "none":
+                _cache = NullCache()
+            else:
+                raise ValueError(f"Unknown CACHE_BACKEND: {CACHE_BACKEND}")
+            logger.info(f"Using {type(_cache).__name__} cache")
+        return _cache
@@ -0,0 +1,174 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Optional
+import startup
+
+logger = logging.getLogger(__name__)
+
+# Model routing: cheap/fast models for questions, stronger models for scripts.
+# Each list is tried in order, falling back to the next model when one fails or times out.
+def _model_list(variable: str, default: str) -> List[str]:
+    models = [name.strip() for name in os.environ.get(variable, "").split(",") if name.strip()]
+    return models or default.split(",")
+
+
+QUESTION_MODELS = _model_list("LLM_QUESTION_MODELS", "gemini-1.5-flash,gemini-pro")
+SCRIPT_MODELS = _model_list("LLM_SCRIPT_MODELS", "gemini-1.5-pro,gemini-pro")
+
+# Deadline for a single model attempt, in seconds
+DEFAULT_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "30"))
+
+# Fire a second identical request if the first hasn't answered after this many seconds (0 disables hedging)
+DEFAULT_HEDGE_AFTER = float(os.environ.get("LLM_HEDGE_AFTER", "8"))
+
+# Shared pool for LLM calls. Calls that lose a hedge or time out are cancelled if still
+# queued; ones already running end at their own request deadline.
+LLM_MAX_WORKERS = int(os.environ.get("LLM_MAX_WORKERS", "32"))
+_executor = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix="llm")
+
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+# google.generativeai pulls in grpc and the whole Google API stack, so it is only
+# imported (and the client configured) the first time a model is needed
+_genai = None
+_genai_lock = threading.Lock()
+_api_key = None
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+class LLMError(Exception):
+    """Raised when every model in a route failed or timed out"""
+
+
+def configure(api_key: str):
+    """Set the Gemini API key; the client itself is created lazily on first use"""
+    global _api_key
+    _api_key = api_key
+
+
+def _get_genai():
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            with startup.phase("import google.generativeai"):
+                import google.generativeai as genai
+            with startup.phase("configure gemini client"):
+                genai.configure(api_key=_api_key)
+            _genai = genai
+        return _genai
+
+
+def _get_model(model_name: str):
+    genai = _get_genai()
+    with _models_lock:
+        if model_name not in _models:
+            _models[model_name] = genai.GenerativeModel(model_name)
+        return _models[model_name]
+
+
+def warm_up():
+    """Import the Gemini SDK and create the first-choice models ahead of the first request"""
+    _get_genai()
+    with startup.phase("create gemini models"):
+        for model_name in dict.fromkeys(QUESTION_MODELS[:1] + SCRIPT_MODELS[:1]):
+            _get_model(model_name)
+
+
+def _call(model_name: str, history: List[Dict], prompt: str, timeout: float) -> str:
+    chat = _get_model(model_name).start_chat(history=history)
+    response = chat.send_message(prompt, request_options={"timeout": timeout})
+    return response.text
+
+
+def _submit(model_name: str, history: List[Dict], prompt: str, timeout: float):
+    global _in_flight
+
+    def finished(_):
+        global _in_flight
+        with _in_flight_lock:
+            _in_flight -= 1
+
+    with _in_flight_lock:
+        _in_flight += 1
+    future = _executor.submit(_call, model_name, history, prompt, timeout)
+    future.add_done_callback(finished)
+    return future
+
+
+def _pool_saturated() -> bool:
+    with _in_flight_lock:
+        return _in_flight >= LLM_MAX_WORKERS
+
+
+def _hedged_call(model_name: str, history: List[Dict], prompt: str, timeout: float, hedge_after: float) -> str:
+    """
+    Call one model with a hard deadline. If hedge_after is set and the first request
+    is still running after that many seconds, send a duplicate and take whichever
+    finishes first. No hedge is sent while the pool is saturated, since it would
+    only queue behind the calls it is meant to overtake.
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    pending = {_submit(model_name, history, prompt, timeout)}
+    hedged = not hedge_after or hedge_after >= timeout
+    last_error = None
+
+    try:
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+
+            wait_for = deadline - now
+            if not hedged:
+                wait_for = min(wait_for, max(0, start + hedge_after - now))
+
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                last_error = future.exception()
+                logger.warning(f"LLM call to {model_name} failed: {last_error}")
+
+            if pending and not hedged and time.monotonic() - start >= hedge_after:
+                hedged = True
+                if _pool_saturated():
+                    logger.info(f"LLM call to {model_name} slower than {hedge_after}s, pool saturated so not hedging")
+                else:
+                    logger.info(f"LLM call to {model_name} slower than {hedge_after}s, sending hedged request")
+                    pending.add(_submit(model_name, history, prompt, deadline - time.monotonic()))
+
+        if last_error is not None and not pending:
+            raise last_error
+        raise TimeoutError(f"{model_name} did not respond within {timeout}s")
+    finally:
+        # Drop losers and timed-out calls that haven't started yet
+        for future in pending:
+            future.cancel()
+
+
+def send_message(model_names: List[str], history: List[Dict], prompt: str,
+                 timeout: float = None, hedge_after: Optional[float] = None) -> str:
+    """
+    Send a prompt on top of the given chat history and return the response text.
+    Models are tried in order; each attempt is bounded by timeout, so the total
+    latency is at most timeout * len(model_names).
+    """
+    timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+    hedge_after = DEFAULT_HEDGE_AFTER if hedge_after is None else hedge_after
+
+    errors = []
+    for model_name in model_names:
+        try:
+            return _hedged_call(model_name, history, prompt, timeout, hedge_after)
+        except Exception as e:
+            logger.warning(f"Falling back from {model_name}: {e}")
+            errors.append(f"{model_name}: {e}")
+
+    raise LLMError("All models failed: " + "; ".join(errors))
@@ -1,13 +1,13 @@
 import os
-import google.generativeai as genai
 from typing import List, Dict
 from run_cloud import run_terraform
+from terraform_blocks import strip_language_marker
+from batch import generate_merged_script
+import llm
+from cache import get_cache
 
-# Configure the Gemini model client
-genai.configure(api_key="daedesd")
-
-# Initialize Gemini pro model
-model = genai.GenerativeModel("gemini-pro")
+# Configure the Gemini model client (created on first use)
+llm.configure(api_key="daedesd")
 
 def get_required_information(resource_type: str) -> List[str]:
     """
@@ -15,37 +15,46 @@ def get_required_information(resource_type: str) -> List[str]:
     Returns a list of questions to be asked in the frontend.
     """
     try:
-        # Start a chat to get the required information
-        chat = model.start_chat(history=[
-            {
-                "role": "user",
-                "parts": ["You are an AI assistant that helps users create the most basic Terraform Infrastructure as Code scripts for cloud resource provisioning. Given a cloud resource type, return ONLY a list of questions (always including necessary credentials associated to the user's account) that need to be answered to create the most basic version of the Terraform configuration, with no additional text."]
-            },
-            {
-                "role": "model",
-                "parts": ["I will provide only the necessary questions (always including necessary credentials associated to the user's account) for the most basic Terraform cloud infrastructure configuration when given a resource type. Please provide the resource type."]
-            }
-        ])
-        
-        # Ask for the questions
-        response = chat.send_message(f"What information is needed to create the most basic Terraform Infrastructure as Code configuration for {resource_type}? Return ONLY the questions (always including access key, secret key, and region), one per line, with no additional text.")
-        
-        # Split the response into individual questions and remove duplicates while maintaining order
-        seen = set()
-        questions = []
-        for q in [q.strip() for q in response.text.split('\n') if q.strip()]:
-            if q not in seen:
-                seen.add(q)
-                questions.append(q)
-        
-        # Add the additional specifications question
-        questions.append("Do you have any additional specifications or requirements? (Type 'none' if none)")
-        
-        return questions
+        # Questions only depend on the resource type, so they are generated once per node and
+        # shared by every worker; callers missing the same key wait for the first one
+        cache_key = f"questions:{resource_type.strip().lower()}"
+        return get_cache().get_or_set(cache_key, lambda: ask_required_questions(resource_type))
     except Exception as e:
         print(f"Error getting questions: {str(e)}")
         return []
 
+def ask_required_questions(resource_type: str) -> List[str]:
+    """
+    Ask the LLM for the questions needed for a resource type.
+    Raises on failure so nothing is cached.
+    """
+    history = [
+        {
+            "role": "user",
+            "parts": ["You are an AI assistant that helps users create the most basic Terraform Infrastructure as Code scripts for cloud resource provisioning. Given a cloud resource type, return ONLY a list of questions (always including necessary credentials associated to the user's account) that need to be answered to create the most basic version of the Terraform configuration, with no additional text."]
+        },
+        {
+            "role": "model",
+            "parts": ["I will provide only the necessary questions (always including necessary credentials associated to the user's account) for the most basic Terraform cloud infrastructure configuration when given a resource type. Please provide the resource type."]
+        }
+    ]
+    
+    # Ask for the questions
+    response_text = llm.send_message(llm.QUESTION_MODELS, history, f"What information is needed to create the most basic Terraform Infrastructure as Code configuration for {resource_type}? Return ONLY the questions (always including access key, secret key, and region), one per line, with no additional text.")
+    
+    # Split the response into individual questions and remove duplicates while maintaining order
+    seen = set()
+    questions = []
+    for q in [q.strip() for q in response_text.split('\n') if q.strip()]:
+        if q not in seen:
+            seen.add(q)
+            questions.append(q)
+    
+    # Add the additional specifications question
+    questions.append("Do you have any additional specifications or requirements? (Type 'none' if none)")
+    
+    return questions
+
 def generate_terraform_script_from_answers(resource_type: str, answers: List[str], questions: List[str]) -> str:
     """
     Generate a Terraform script using the provided answers.
@@ -63,7 +72,7 @@ def generate_terraform_script_from_answers(resource_type: str, answers: List[str
         qa_text = "\n".join(qa_pairs)
         
         # Start new chat with explicit infrastructure context
-        chat = model.start_chat(history=[
+        history = [
             {
                 "role": "user",
                 "parts": ["You are an AI assistant that helps users create the most basic Terraform Infrastructure as Code scripts for cloud resource provisioning. Given a cloud resource type, return ONLY a list of questions (always including access key, secret key, and region) that need to be answered to create the most basic version of the Terraform configuration, with no additional text."]
@@ -72,7 +81,7 @@ def generate_terraform_script_from_answers(resource_type: str, answers: List[str
                 "role": "model",
                 "parts": ["I will provide only the necessary questions (including access key, secret key, and region) for the most basic Terraform cloud infrastructure configuration when given a resource type. Please provide the resource type."]
             }
-        ])
+        ]
         
         # Send the resource type and Q&A pairs with explicit infrastructure context
         prompt = f"""
@@ -87,10 +96,8 @@ def generate_terraform_script_from_answers(resource_type: str, answers: List[str
                 """
         
         try:
-            response = chat.send_message(prompt)
-            
-            # Extract the Terraform script from the response
-            script_text = response.text
+            # Script generation goes to the stronger models, with deadline and fallback
+            script_text = llm.send_message(llm.SCRIPT_MODELS, history, prompt)
             
             # Clean up the response to extract just the code
             if "```" in script_text:
@@ -107,6 +114,14 @@ def generate_terraform_script_from_answers(resource_type: str, answers: List[str
     except Exception as e:
         return f"Error in script generation: {str(e)}"
 
+def generate_terraform_scripts_batch(resource_specs: List[Dict], max_workers: int = None) -> str:
+    """
+    Generate one merged Terraform script for several resources.
+    Each spec is a dict with resource_type, questions and answers; the LLM calls
+    run concurrently and the fragments are merged with a single provider block.
+    """
+    return generate_merged_script(generate_terraform_script_from_answers, resource_specs, max_workers)
+
 def get_manual_answers(questions: List[str]) -> List[str]:
     """
     Manually collect answers for testing purposes.
@@ -177,13 +192,8 @@ if __name__ == "__main__":
 
         print("\n\n\n\n\nDoing terraform config")
 
-        # Check if the first line contains "hdl"
-        if "hcl" in script.splitlines()[0]:
-            # Remove the first line if "hdl" is found
-            new_script = "\n".join(script.splitlines()[1:])
-        else:
-            # Otherwise, keep the script unchanged
-            new_script = script
+        # Remove the "hcl" language marker line if present
+        new_script = strip_language_marker(script)
 
         # print(new_script)
         run_terraform(new_script)
@@ -1,4 +1,117 @@
+import os
+import re
+import time
+import uuid
+import fcntl
+import shutil
 import subprocess
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from terraform_blocks import split_independent_configs, diff_scripts, redact_secrets
+
+# Default -parallelism for each terraform plan/apply (terraform's own default is 10)
+TERRAFORM_PARALLELISM = int(os.environ.get("TERRAFORM_PARALLELISM", "10"))
+
+# Cap on terraform runs executing at once on this node, across all requests and worker
+# processes. Runs mostly wait on cloud APIs, so this is not tied to the CPU count.
+MAX_TERRAFORM_PROCESSES = int(os.environ.get("MAX_TERRAFORM_PROCESSES", "8"))
+
+# How often a run waiting for a free slot checks again (seconds)
+SLOT_POLL_INTERVAL = 0.2
+
+# Each parallel run gets its own directory under this one, with a root module (and state) per split configuration
+TERRAFORM_RUNS_DIR = os.environ.get("TERRAFORM_RUNS_DIR", "./terraform_runs")
+
+# Run directories (state and .terraform) are deleted once they are older than this (seconds)
+TERRAFORM_RUNS_RETENTION = float(os.environ.get("TERRAFORM_RUNS_RETENTION", str(24 * 60 * 60)))
+
+# Persistent per-tenant workspaces (.terraform, lock file and state survive between submissions)
+TERRAFORM_WORKSPACES_DIR = os.environ.get("TERRAFORM_WORKSPACES_DIR", "./terraform_workspaces")
+
+# Providers are downloaded once into a shared plugin cache. The cache is not safe
+# for concurrent writes, so init runs one at a time on the node (see _init_lock);
+# plan/apply run in parallel.
+
+
+def _terraform_env():
+    env = dict(os.environ)
+    env.setdefault("TF_PLUGIN_CACHE_DIR", os.path.abspath(os.path.join(TERRAFORM_RUNS_DIR, ".plugin-cache")))
+    os.makedirs(env["TF_PLUGIN_CACHE_DIR"], exist_ok=True)
+    return env
+
+
+@contextmanager
+def _file_lock(path):
+    """
+    Exclusive lock held across threads and worker processes (gunicorn runs several).
+    Uses flock, which the OS releases if the holding process dies.
+    """
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _init_lock(env):
+    """Lock guarding the plugin cache, kept next to it"""
+    return _file_lock(env["TF_PLUGIN_CACHE_DIR"].rstrip(os.sep) + ".lock")
+
+
+@contextmanager
+def _terraform_slot():
+    """
+    Hold one of MAX_TERRAFORM_PROCESSES slots shared by every worker process on the
+    node. Each slot is a lock file; a run takes the first free one, or waits.
+    """
+    lock_dir = os.path.join(TERRAFORM_RUNS_DIR, ".locks")
+    os.makedirs(lock_dir, exist_ok=True)
+    while True:
+        for slot in range(MAX_TERRAFORM_PROCESSES):
+            lock_file = open(os.path.join(lock_dir, f"slot-{slot}.lock"), "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                continue
+            with lock_file:
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+            return
+        time.sleep(SLOT_POLL_INTERVAL)
+
+
+def _write_config(directory, terraform_string):
+    """Write main.tf readable by this user only, since it contains the provider credentials"""
+    with open(os.open(os.path.join(directory, "main.tf"), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as file:
+        file.write(terraform_string)
+
+
+def _remove_credentials(directory):
+    """Delete main.tf and the plan file, which both contain the provider credentials"""
+    for name in ("main.tf", "tfplan"):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _prune_runs():
+    """Delete run directories older than TERRAFORM_RUNS_RETENTION (locks and the plugin cache are kept)"""
+    if not os.path.isdir(TERRAFORM_RUNS_DIR):
+        return
+    cutoff = time.time() - TERRAFORM_RUNS_RETENTION
+    for name in os.listdir(TERRAFORM_RUNS_DIR):
+        path = os.path.join(TERRAFORM_RUNS_DIR, name)
+        if name.startswith(".") or not os.path.isdir(path):
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
 
 
 def string_to_tf_file(terraform_string):
@@ -26,6 +139,124 @@ def run_terraform(terraform_string):
     except subprocess.CalledProcessError as e:
         print(f"Error executing Terraform: {e}")
 
+def _run_component(directory, addresses, terraform_string, parallelism, env):
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    result = {"addresses": addresses, "directory": directory}
+    try:
+        _write_config(directory, terraform_string)
+        with _terraform_slot():
+            with _init_lock(env):
+                subprocess.run(["terraform", "init", "-input=false"], cwd=directory, env=env, check=True)
+            subprocess.run(["terraform", "plan", "-input=false", f"-parallelism={parallelism}", "-out=tfplan"],
+                           cwd=directory, env=env, check=True)
+            subprocess.run(["terraform", "apply", "-input=false", f"-parallelism={parallelism}", "-auto-approve", "tfplan"],
+                           cwd=directory, env=env, check=True)
+        result["success"] = True
+    except subprocess.CalledProcessError as e:
+        print(f"Error executing Terraform for {', '.join(addresses)}: {e}")
+        result["success"] = False
+        result["error"] = str(e)
+    finally:
+        _remove_credentials(directory)
+    return result
+
+
+def run_terraform_parallel(terraform_string, parallelism=None):
+    """
+    Apply a configuration as independent root modules, one per subgraph of its
+    dependency graph, each with its own state. Subgraphs are applied concurrently
+    (bounded by MAX_TERRAFORM_PROCESSES across the node), so wall time follows the longest
+    dependency chain rather than the total number of resources.
+    Every call works in a fresh directory under TERRAFORM_RUNS_DIR, so unrelated
+    requests never share configuration or state even when resource names collide.
+    main.tf and the plan file are removed after each run; the state and .terraform
+    are kept for TERRAFORM_RUNS_RETENTION seconds and pruned by later calls.
+    """
+    parallelism = parallelism or TERRAFORM_PARALLELISM
+    components = split_independent_configs(terraform_string)
+    if not components:
+        raise ValueError("Terraform script does not define any resources")
+
+    _prune_runs()
+    env = _terraform_env()
+    run_dir = os.path.join(TERRAFORM_RUNS_DIR, uuid.uuid4().hex)
+    os.makedirs(run_dir, mode=0o700)
+    directories = [os.path.join(run_dir, f"component_{i}") for i in range(len(components))]
+
+    with ThreadPoolExecutor(max_workers=len(components)) as executor:
+        results = list(executor.map(
+            lambda directory, component: _run_component(directory, component[0], component[1], parallelism, env),
+            directories, components
+        ))
+
+    if all(result["success"] for result in results):
+        print(f"Terraform script executed successfully in {len(results)} parallel run(s).")
+    return results
+
+
+def run_terraform_incremental(terraform_string, tenant_id, parallelism=None):
+    """
+    Apply a script in the tenant's persistent workspace, redoing only what changed
+    since the last successful apply: init is skipped unless providers, modules or
+    terraform settings changed, and the plan is limited with -target to the changed
+    resources (and their dependents) unless a provider, variable, local or output changed.
+
+    tenant_id must come from tenants.tenant_from_token, never straight from the
+    request: whoever knows it can plan and apply into the workspace's state.
+    Credentials in the script are only on disk while terraform runs; main.tf and
+    the plan file are removed afterwards and the last applied script is kept with
+    its credentials replaced by digests (see redact_secrets).
+    """
+    if not tenant_id or not re.fullmatch(r"[\w-]+", tenant_id):
+        raise ValueError("tenant_id must be a non-empty string of letters, digits, '_' or '-'")
+
+    parallelism = parallelism or TERRAFORM_PARALLELISM
+    directory = os.path.join(TERRAFORM_WORKSPACES_DIR, tenant_id)
+    last_applied_path = os.path.join(directory, "last_applied.txt")
+    redacted = redact_secrets(terraform_string)
+
+    # One submission at a time per tenant workspace, across all worker processes
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    with _file_lock(os.path.join(directory, "workspace.lock")):
+        previous = ""
+        if os.path.exists(last_applied_path):
+            with open(last_applied_path) as file:
+                previous = file.read()
+
+        changes = diff_scripts(previous, redacted)
+        result = {"workspace": directory, "init_skipped": True, "targets": [], "full_plan": changes["full_plan"]}
+        if changes["unchanged"]:
+            print(f"No changes for tenant {tenant_id}, skipping Terraform.")
+            result["skipped"] = True
+            return result
+
+        env = _terraform_env()
+        plan_command = ["terraform", "plan", "-input=false", f"-parallelism={parallelism}", "-out=tfplan"]
+        if not changes["full_plan"]:
+            result["targets"] = changes["targets"]
+            plan_command += [f"-target={address}" for address in changes["targets"]]
+
+        try:
+            _write_config(directory, terraform_string)
+
+            with _terraform_slot():
+                if changes["init_required"] or not os.path.isdir(os.path.join(directory, ".terraform")):
+                    result["init_skipped"] = False
+                    with _init_lock(env):
+                        subprocess.run(["terraform", "init", "-input=false"], cwd=directory, env=env, check=True)
+                subprocess.run(plan_command, cwd=directory, env=env, check=True)
+                subprocess.run(["terraform", "apply", "-input=false", f"-parallelism={parallelism}", "-auto-approve", "tfplan"],
+                               cwd=directory, env=env, check=True)
+        finally:
+            _remove_credentials(directory)
+
+        # Only remember the script once it is applied, so a failed run is planned again next time
+        with open(last_applied_path, "w") as file:
+            file.write(redacted)
+
+        print(f"Terraform script applied incrementally for tenant {tenant_id}.")
+        return result
+
 # Run Terraform
 # run_terraform()
 
@@ -0,0 +1,69 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Taken when this module is first imported, i.e. at the very start of app boot
+BOOT_TIME = time.perf_counter()
+
+_phases = []
+_phases_lock = threading.Lock()
+_ready = threading.Event()
+_ready_at = None
+
+
+@contextmanager
+def phase(name: str):
+    """Time a startup phase (an import, client creation, ...) for the startup report"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _phases_lock:
+            _phases.append({
+                "phase": name,
+                "started_at": round(start - BOOT_TIME, 4),
+                "seconds": round(time.perf_counter() - start, 4)
+            })
+
+
+def mark_ready():
+    """Mark the process as ready to serve requests without paying any warm-up cost"""
+    global _ready_at
+    if not _ready.is_set():
+        _ready_at = time.perf_counter() - BOOT_TIME
+        _ready.set()
+        logger.info(f"Ready {_ready_at:.3f}s after boot: {report()['phases']}")
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def warm_in_background(warm_up: Callable[[], None]) -> threading.Thread:
+    """Run the heavy warm-up off the request path and mark the process ready when done"""
+    def run():
+        try:
+            warm_up()
+            mark_ready()
+        except Exception as e:
+            logger.error(f"Background warm-up failed: {str(e)}")
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def report() -> Dict:
+    """Breakdown of boot time by phase"""
+    with _phases_lock:
+        phases = list(_phases)
+    return {
+        "ready": _ready.is_set(),
+        "ready_after_seconds": None if _ready_at is None else round(_ready_at, 4),
+        "uptime_seconds": round(time.perf_counter() - BOOT_TIME, 4),
+        "phases": phases
+    }
@@ -0,0 +1,33 @@
+import os
+import hmac
+import uuid
+import hashlib
+
+# Secret used to sign tenant tokens; persistent tenant workspaces are disabled without it
+TENANT_SECRET = os.environ.get("TENANT_SECRET", "")
+
+
+def _signature(tenant_id: str) -> str:
+    return hmac.new(TENANT_SECRET.encode("utf-8"), tenant_id.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def issue_tenant_token() -> str:
+    """Create a new tenant and return its token ("<tenant id>.<signature>")"""
+    if not TENANT_SECRET:
+        raise ValueError("Persistent workspaces are disabled: TENANT_SECRET is not set")
+    tenant_id = uuid.uuid4().hex
+    return f"{tenant_id}.{_signature(tenant_id)}"
+
+
+def tenant_from_token(token: str) -> str:
+    """
+    Return the tenant id of a token issued by issue_tenant_token, or raise a
+    ValueError. Tenant ids are random and signed by the server, so a caller can
+    only reach a workspace whose token it was given.
+    """
+    if not TENANT_SECRET:
+        raise ValueError("Persistent workspaces are disabled: TENANT_SECRET is not set")
+    tenant_id, _, signature = (token or "").partition(".")
+    if not tenant_id or not hmac.compare_digest(signature, _signature(tenant_id)):
+        raise ValueError("Invalid tenant token")
+    return tenant_id
@@ -0,0 +1,556 @@
+import re
+import hashlib
+import logging
+from typing import Dict, List, NamedTuple, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Block(NamedTuple):
+    """A top-level HCL block, e.g. resource "aws_instance" "web" { ... }"""
+    kind: str
+    labels: Tuple[str, ...]
+    text: str
+
+    @property
+    def address(self) -> str:
+        """Terraform address of the block (aws_instance.web, data.aws_ami.ubuntu, ...)"""
+        if self.kind == "resource":
+            return ".".join(self.labels)
+        if self.kind in ("data", "module", "variable", "output"):
+            prefix = "var" if self.kind == "variable" else self.kind
+            return ".".join((prefix,) + self.labels)
+        return ".".join((self.kind,) + self.labels)
+
+
+def strip_language_marker(script: str) -> str:
+    """Remove a leading code fence language line (e.g. "hcl") left over by the LLM"""
+    lines = script.splitlines()
+    if lines and "hcl" in lines[0]:
+        return "\n".join(lines[1:])
+    return script
+
+
+def _skip_string(script: str, i: int) -> int:
+    """Return the index just past the quoted string starting at script[i]"""
+    i += 1
+    while i < len(script):
+        if script[i] == "\\":
+            i += 2
+            continue
+        if script[i] == '"':
+            return i + 1
+        i += 1
+    return i
+
+
+def _skip_heredoc(script: str, i: int) -> int:
+    """Return the index just past the heredoc whose <<MARKER starts at script[i]"""
+    line_end = script.find("\n", i)
+    if line_end == -1:
+        return len(script)
+    marker = script[i + 2:line_end].lstrip("-").strip()
+    pos = line_end + 1
+    while pos < len(script):
+        next_end = script.find("\n", pos)
+        if next_end == -1:
+            next_end = len(script)
+        if script[pos:next_end].strip() == marker:
+            return next_end
+        pos = next_end + 1
+    return len(script)
+
+
+def _skip_comment(script: str, i: int) -> int:
+    """Return the index just past the comment starting at script[i], or i if there is none"""
+    if script.startswith("/*", i):
+        end = script.find("*/", i + 2)
+        return len(script) if end == -1 else end + 2
+    if script[i] == "#" or script.startswith("//", i):
+        end = script.find("\n", i)
+        return len(script) if end == -1 else end
+    return i
+
+
+def _parse_header(header: str) -> Tuple[str, Tuple[str, ...]]:
+    """Split a block header like 'resource "aws_instance" "web"' into kind and labels"""
+    parts = []
+    i = 0
+    while i < len(header):
+        if header[i].isspace():
+            i += 1
+        elif header[i] == '"':
+            end = _skip_string(header, i)
+            parts.append(header[i + 1:end - 1])
+            i = end
+        else:
+            end = i
+            while end < len(header) and not header[end].isspace() and header[end] != '"':
+                end += 1
+            parts.append(header[i:end])
+            i = end
+    if not parts:
+        raise ValueError("Found a Terraform block without a type")
+    return parts[0], tuple(parts[1:])
+
+
+def split_blocks(script: str) -> List[Block]:
+    """
+    Split a Terraform configuration into its top-level blocks.
+    Comments between blocks are dropped; strings, heredocs and comments
+    inside a block are skipped when matching braces.
+    """
+    blocks = []
+    i = 0
+    header_start = None
+    while i < len(script):
+        char = script[i]
+        skipped = _skip_comment(script, i)
+        if skipped != i:
+            i = skipped
+            continue
+        if char.isspace():
+            i += 1
+            continue
+        if header_start is None:
+            header_start = i
+        if char == '"':
+            i = _skip_string(script, i)
+            continue
+        if char != "{":
+            i += 1
+            continue
+
+        kind, labels = _parse_header(script[header_start:i])
+        depth = 0
+        while i < len(script):
+            skipped = _skip_comment(script, i)
+            if skipped != i:
+                i = skipped
+                continue
+            if script[i] == '"':
+                i = _skip_string(script, i)
+                continue
+            if script.startswith("<<", i):
+                i = _skip_heredoc(script, i)
+                continue
+            if script[i] == "{":
+                depth += 1
+            elif script[i] == "}":
+                depth -= 1
+                if depth == 0:
+                    break
+            i += 1
+        if depth != 0:
+            raise ValueError(f"Unbalanced braces in Terraform block '{kind}'")
+
+        blocks.append(Block(kind, labels, script[header_start:i + 1].strip()))
+        header_start = None
+        i += 1
+
+    if header_start is not None:
+        raise ValueError(f"Unexpected trailing text in Terraform script: {script[header_start:].strip()[:40]}")
+    return blocks
+
+
+def _body_items(text: str) -> List[Tuple[str, str]]:
+    """
+    Top-level items of a block body as (name, text) pairs, where an item is an
+    attribute ("region = ...") or a nested block ("required_providers { ... }").
+    Items end at the first newline outside brackets, strings and heredocs.
+    """
+    end = text.rindex("}")
+    i = text.index("{") + 1
+    items = []
+    while i < end:
+        skipped = _skip_comment(text, i)
+        if skipped != i:
+            i = skipped
+            continue
+        if text[i].isspace() or text[i] == ",":
+            i += 1
+            continue
+
+        item_start = i
+        depth = 0
+        while i < end:
+            skipped = _skip_comment(text, i)
+            if skipped != i:
+                i = skipped
+                continue
+            char = text[i]
+            if char == '"':
+                i = _skip_string(text, i)
+                continue
+            if text.startswith("<<", i):
+                i = _skip_heredoc(text, i)
+                continue
+            if char in "{[(":
+                depth += 1
+            elif char in "}])":
+                depth -= 1
+            elif char == "\n" and depth == 0:
+                break
+            i += 1
+
+        item = text[item_start:i].strip().rstrip(",")
+        name = re.match(r'"?([\w-]*)', item).group(1)
+        items.append((name, item))
+    return items
+
+
+def _attribute_value(block: Block, name: str) -> str:
+    """Raw value of a top-level attribute of the block, or an empty string if it isn't set"""
+    for item_name, item in _body_items(block.text):
+        key, sep, value = item.partition("=")
+        if item_name == name and sep and key.strip() == name:
+            return value.strip()
+    return ""
+
+
+def _provider_alias(block: Block) -> str:
+    """Return the alias of a provider block, or an empty string for the default configuration"""
+    return _attribute_value(block, "alias").strip('"')
+
+
+def _with_attribute(block: Block, name: str, value: str) -> Block:
+    """Copy of the block with a top-level attribute set (replacing any existing one)"""
+    header = block.text[:block.text.index("{")].strip()
+    items = [item for item_name, item in _body_items(block.text)
+             if not (item_name == name and item.partition("=")[0].strip() == name)]
+    body = "\n".join(f"  {item}" for item in [f"{name} = {value}"] + items)
+    return Block(block.kind, block.labels, f"{header} {{\n{body}\n}}")
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _strip_comments(text: str) -> str:
+    """Remove comments from a piece of HCL, leaving strings and heredocs untouched"""
+    parts = []
+    start = i = 0
+    while i < len(text):
+        skipped = _skip_comment(text, i)
+        if skipped != i:
+            parts.append(text[start:i])
+            start = i = skipped
+        elif text[i] == '"':
+            i = _skip_string(text, i)
+        elif text.startswith("<<", i):
+            i = _skip_heredoc(text, i)
+        else:
+            i += 1
+    parts.append(text[start:])
+    return "".join(parts)
+
+
+def _settings_key(block: Block) -> Tuple[str, ...]:
+    """Comment- and layout-insensitive form of a block's body, for comparing configurations"""
+    return tuple(sorted(_normalize(_strip_comments(item)) for _, item in _body_items(block.text)))
+
+
+# Anything that looks like a reference to another block: aws_instance.web, data.aws_ami.x, module.vpc, local.tags
+_REFERENCE = re.compile(r"\b(data\.[\w-]+\.[\w-]+|module\.[\w-]+|local\.[\w-]+|[a-z][a-z0-9]*_[\w-]+\.[\w-]+)")
+
+# Blocks that are copied into every split configuration rather than being graph nodes
+_SHARED_KINDS = ("terraform", "provider", "variable")
+
+
+def _local_names(block: Block) -> List[str]:
+    """Names defined by a locals block (top-level "name = ..." lines)"""
+    names = []
+    depth = 0
+    for line in block.text.splitlines()[1:]:
+        if depth == 0:
+            match = re.match(r"\s*([\w-]+)\s*=", line)
+            if match:
+                names.append(f"local.{match.group(1)}")
+        depth += line.count("{") + line.count("[") - line.count("}") - line.count("]")
+    return names
+
+
+def _provider_used(provider: Block, nodes: List[Block]) -> bool:
+    """Whether any resource or data source in nodes belongs to the provider (modules may use any)"""
+    name = provider.labels[0] if provider.labels else ""
+    return any(
+        block.kind == "module" or
+        (block.kind in ("resource", "data") and block.labels and
+         (block.labels[0] == name or block.labels[0].startswith(f"{name}_")))
+        for block in nodes
+    )
+
+
+def _reference_graph(nodes: List[Block]) -> Dict[int, Set[int]]:
+    """Edges i -> j for every node i whose body references node j"""
+    index: Dict[str, int] = {}
+    for i, block in enumerate(nodes):
+        for address in (_local_names(block) if block.kind == "locals" else [block.address]):
+            index[address] = i
+
+    edges: Dict[int, Set[int]] = {i: set() for i in range(len(nodes))}
+    for i, block in enumerate(nodes):
+        body = block.text[block.text.index("{"):]
+        for reference in _REFERENCE.findall(body):
+            j = index.get(reference)
+            if j is not None and j != i:
+                edges[i].add(j)
+    return edges
+
+
+def split_independent_configs(script: str) -> List[Tuple[List[str], str]]:
+    """
+    Split a configuration into independent subgraphs of its dependency graph.
+    Resources, data sources, modules, locals and outputs are connected whenever one
+    references another; each connected component becomes its own configuration with
+    the terraform/variable blocks and the providers it uses copied in.
+    A configuration with a backend or cloud block is not split, since every copy
+    would read and write the same remote state.
+    Returns (addresses, script) pairs, largest component first.
+    """
+    blocks = split_blocks(strip_language_marker(script))
+    shared = [block for block in blocks if block.kind in _SHARED_KINDS]
+    nodes = [block for block in blocks if block.kind not in _SHARED_KINDS]
+
+    if any(name in ("backend", "cloud") for block in blocks if block.kind == "terraform"
+           for name, _ in _body_items(block.text)):
+        text = "\n\n".join(block.text for block in blocks) + "\n"
+        return [([block.address for block in nodes], text)]
+
+    parent = list(range(len(nodes)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, references in _reference_graph(nodes).items():
+        for j in references:
+            parent[find(i)] = find(j)
+
+    components: Dict[int, List[Block]] = {}
+    for i, block in enumerate(nodes):
+        components.setdefault(find(i), []).append(block)
+
+    configs = []
+    for component in sorted(components.values(), key=len, reverse=True):
+        kept = [block for block in shared if block.kind != "provider" or _provider_used(block, component)]
+        text = "\n\n".join(block.text for block in kept + component) + "\n"
+        configs.append(([block.address for block in component], text))
+    return configs
+
+
+# Blocks that can be planned on their own with -target
+_TARGETABLE_KINDS = ("resource", "data", "module")
+
+
+def _provider_names(blocks: List[Block]) -> Set[str]:
+    """Providers a configuration needs: declared ones plus those implied by resource types"""
+    names = {block.labels[0] for block in blocks if block.kind == "provider" and block.labels}
+    names |= {block.labels[0].split("_")[0] for block in blocks if block.kind in ("resource", "data") and block.labels}
+    return names
+
+
+def diff_scripts(old_script: str, new_script: str) -> Dict:
+    """
+    Compare two versions of a configuration.
+    Returns a dict with:
+      init_required - providers, modules or terraform settings changed, so terraform init must run
+      full_plan     - something other than resources/data/modules changed (providers, variables,
+                      locals, outputs), so every resource may be affected
+      targets       - sorted addresses of added, changed and removed resources/data/modules,
+                      plus everything in the new config that depends on them
+      unchanged     - the two configurations are equivalent
+    """
+    old_blocks = split_blocks(strip_language_marker(old_script)) if old_script.strip() else []
+    new_blocks = split_blocks(strip_language_marker(new_script))
+
+    def targetable(blocks):
+        return {block.address: _normalize(block.text) for block in blocks if block.kind in _TARGETABLE_KINDS}
+
+    def settings(blocks, kinds):
+        return sorted(_normalize(block.text) for block in blocks if block.kind in kinds)
+
+    old_targets, new_targets = targetable(old_blocks), targetable(new_blocks)
+    touched = {address for address in old_targets.keys() | new_targets.keys()
+               if old_targets.get(address) != new_targets.get(address)}
+
+    # Changed resources can force updates on whatever references them
+    nodes = [block for block in new_blocks if block.kind not in _SHARED_KINDS]
+    edges = _reference_graph(nodes)
+    dependents: Dict[int, Set[int]] = {i: set() for i in edges}
+    for i, references in edges.items():
+        for j in references:
+            dependents[j].add(i)
+    queue = [i for i, block in enumerate(nodes) if block.address in touched]
+    seen = set(queue)
+    while queue:
+        for i in dependents[queue.pop()] - seen:
+            seen.add(i)
+            queue.append(i)
+    touched |= {nodes[i].address for i in seen if nodes[i].kind in _TARGETABLE_KINDS}
+
+    old_modules = {a: t for a, t in old_targets.items() if a.startswith("module.")}
+    new_modules = {a: t for a, t in new_targets.items() if a.startswith("module.")}
+    init_required = (
+        settings(old_blocks, ("terraform",)) != settings(new_blocks, ("terraform",)) or
+        old_modules != new_modules or
+        not _provider_names(new_blocks) <= _provider_names(old_blocks)
+    )
+    full_plan = settings(old_blocks, ("provider", "variable", "locals", "output")) != \
+        settings(new_blocks, ("provider", "variable", "locals", "output"))
+
+    return {
+        "init_required": init_required,
+        "full_plan": full_plan,
+        "targets": sorted(touched),
+        "unchanged": not touched and not full_plan and not init_required
+    }
+
+
+# Attributes whose values are credentials (provider keys, tokens, passwords)
+_SECRET_ATTRIBUTES = {
+    "access_key", "secret_key", "token", "access_token", "session_token", "password",
+    "client_secret", "credentials", "api_key", "api_token", "private_key"
+}
+_SECRET_SUFFIXES = ("_secret", "_token", "_password", "_key")
+
+
+def _redact_item(item: str) -> str:
+    """Body item with a credential value replaced by its digest, recursing into nested blocks and objects"""
+    item = _strip_comments(item).strip()
+    key, sep, value = item.partition("=")
+    name = key.strip().strip('"')
+    if sep and re.fullmatch(r"[\w-]+", name) and (name in _SECRET_ATTRIBUTES or name.endswith(_SECRET_SUFFIXES)):
+        return f'{key.rstrip()} = "sha256:{hashlib.sha256(value.strip().encode("utf-8")).hexdigest()}"'
+    if item.endswith("}") and (not sep or "{" in key or value.lstrip().startswith("{")):
+        return _redact_body(item)
+    return item
+
+
+def _redact_body(text: str) -> str:
+    items = [item for _, item in _body_items(text)]
+    redacted = [_redact_item(item) for item in items]
+    if [_normalize(item) for item in redacted] == [_normalize(_strip_comments(item)) for item in items]:
+        return text
+    header = text[:text.index("{")].rstrip()
+    body = "\n".join(f"  {item}" for item in redacted)
+    return f"{header} {{\n{body}\n}}"
+
+
+def redact_secrets(script: str) -> str:
+    """
+    Replace credential attribute values with a digest of the value, wherever they
+    are in a block (single-line blocks and nested blocks included). The result is
+    safe to keep on disk and still changes whenever a credential changes, so it can
+    be compared with diff_scripts.
+    """
+    blocks = split_blocks(strip_language_marker(script))
+    return "\n\n".join(_redact_body(block.text) for block in blocks) + "\n"
+
+
+def _merge_terraform_blocks(blocks: List[Block]) -> List[Block]:
+    """
+    Merge terraform settings blocks into one. required_providers entries from every
+    block are combined (two different sources for one provider raise a ValueError);
+    for other settings the first block's value is kept.
+    """
+    if len(blocks) <= 1:
+        return blocks
+
+    required_providers = {}
+    settings = {}
+    for block in blocks:
+        for name, item in _body_items(block.text):
+            if name != "required_providers":
+                if name not in settings:
+                    settings[name] = item
+                elif _normalize(settings[name]) != _normalize(item):
+                    logger.warning(f"Conflicting terraform setting '{name}' in merged scripts, keeping the first one")
+                continue
+
+            nested = Block("required_providers", (), item)
+            for provider_name, entry in _body_items(nested.text):
+                if provider_name not in required_providers:
+                    required_providers[provider_name] = entry
+                    continue
+                sources = [re.search(r'source\s*=\s*"([^"]+)"', text) for text in (required_providers[provider_name], entry)]
+                sources = [match.group(1).lower() if match else f"hashicorp/{provider_name}" for match in sources]
+                if sources[0] != sources[1]:
+                    raise ValueError(f"Conflicting sources for provider {provider_name}: {sources[0]} and {sources[1]}")
+                if _normalize(required_providers[provider_name]) != _normalize(entry):
+                    logger.warning(f"Conflicting version constraints for provider {provider_name}, keeping the first one")
+
+    items = []
+    if required_providers:
+        entries = "\n".join(f"    {entry}" for entry in required_providers.values())
+        items.append(f"required_providers {{\n{entries}\n  }}")
+    items += settings.values()
+    body = "\n".join(f"  {item}" for item in items)
+    return [Block("terraform", (), f"terraform {{\n{body}\n}}")]
+
+
+def merge_scripts(scripts: List[str]) -> str:
+    """
+    Merge several generated Terraform fragments into one configuration.
+    Identical blocks are deduplicated and the fragments' terraform settings blocks
+    are merged into one. When a fragment configures a provider differently from an
+    earlier one (e.g. another region or credentials), its provider block gets an
+    alias and the fragment's resources are pointed at it with "provider = ...".
+    Two different blocks with the same address raise a ValueError since Terraform
+    would reject them anyway.
+    """
+    terraform_blocks = []
+    providers = {}
+    aliases = {}
+    others = {}
+
+    for script in scripts:
+        blocks = split_blocks(strip_language_marker(script))
+        renamed = {}
+
+        for block in blocks:
+            if block.kind != "provider":
+                continue
+            name = block.labels[0] if block.labels else ""
+            alias = _provider_alias(block)
+            key = (name, alias)
+            if key not in providers:
+                providers[key] = block
+            elif _settings_key(providers[key]) != _settings_key(block):
+                if alias:
+                    raise ValueError(f"Conflicting configurations for provider {name}.{alias} in merged scripts")
+                if any(other.kind == "module" for other in blocks):
+                    raise ValueError(f"Conflicting configurations for provider {name} in a script that uses modules")
+                config_key = (name, _settings_key(block))
+                if config_key not in aliases:
+                    number = 2
+                    while (name, f"{name}_{number}") in providers:
+                        number += 1
+                    aliases[config_key] = f"{name}_{number}"
+                    providers[(name, aliases[config_key])] = _with_attribute(block, "alias", f'"{aliases[config_key]}"')
+                renamed[name] = aliases[config_key]
+
+        for block in blocks:
+            if block.kind == "terraform":
+                if all(_normalize(block.text) != _normalize(t.text) for t in terraform_blocks):
+                    terraform_blocks.append(block)
+                continue
+            if block.kind == "provider":
+                continue
+
+            if block.kind in ("resource", "data") and block.labels:
+                for name, alias in renamed.items():
+                    belongs = block.labels[0] == name or block.labels[0].startswith(f"{name}_")
+                    if belongs and _attribute_value(block, "provider") in ("", name):
+                        block = _with_attribute(block, "provider", f"{name}.{alias}")
+
+            key = (block.kind, block.labels)
+            if key not in others:
+                others[key] = block
+            elif _normalize(others[key].text) != _normalize(block.text):
+                raise ValueError(f"Conflicting definitions for {block.address} in merged scripts")
+
+    merged = _merge_terraform_blocks(terraform_blocks) + list(providers.values()) + list(others.values())
+    return "\n\n".join(block.text for block in merged) + "\n"
@@ -0,0 +1,32 @@
+import pytest
+
+import batch
+
+
+def spec(resource_type, answers=("key", "none")):
+    return {"resource_type": resource_type, "questions": ["Access key?", "Anything else?"], "answers": list(answers)}
+
+
+def test_validate_resource_specs_rejects_bad_batches(monkeypatch):
+    monkeypatch.setattr(batch, "MAX_BATCH_SIZE", 2)
+    for specs in ([], None, [spec("a"), spec("b"), spec("c")], [spec("a", answers=("key",))], [{"resource_type": "a"}]):
+        with pytest.raises(ValueError):
+            batch.validate_resource_specs(specs)
+    batch.validate_resource_specs([spec("a"), spec("b")])
+
+
+def test_generate_merged_script_merges_fragments():
+    def generate(resource_type, answers, questions):
+        return f'provider "aws" {{ region = "us-east-1" }}\nresource "aws_{resource_type}" "this" {{}}'
+
+    merged = batch.generate_merged_script(generate, [spec("instance"), spec("s3_bucket")])
+    assert merged.count('provider "aws"') == 1
+    assert 'resource "aws_instance" "this"' in merged and 'resource "aws_s3_bucket" "this"' in merged
+
+
+def test_generate_merged_script_reports_failed_fragments():
+    def generate(resource_type, answers, questions):
+        return "Error generating Terraform script: boom" if resource_type == "bad" else 'resource "aws_x" "y" {}'
+
+    with pytest.raises(ValueError, match="bad"):
+        batch.generate_merged_script(generate, [spec("good"), spec("bad")])
@@ -0,0 +1,66 @@
+import os
+import time
+import sqlite3
+import multiprocessing
+
+import pytest
+
+import cache
+
+
+def _slow_compute_in_worker(path, counter_path):
+    def compute():
+        with open(counter_path, "a") as file:
+            file.write("x")
+        time.sleep(0.5)
+        return ["question"]
+    return cache.SQLiteCache(path).get_or_set("questions:vpc", compute)
+
+
+def test_cache_backend_is_abstract():
+    with pytest.raises(TypeError):
+        cache.CacheBackend()
+
+
+def test_sqlite_cache_errors_are_misses(tmp_path):
+    broken = cache.SQLiteCache(str(tmp_path / "missing" / "cache.sqlite3"))
+    assert broken.get("key") is None
+    broken.set("key", "value")
+    assert broken.get_or_set("key", lambda: ["computed"]) == ["computed"]
+
+
+def test_sqlite_cache_single_flight_across_processes(tmp_path):
+    path, counter_path = str(tmp_path / "cache.sqlite3"), str(tmp_path / "computes")
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        results = pool.starmap(_slow_compute_in_worker, [(path, counter_path)] * 4)
+    assert results == [["question"]] * 4
+    with open(counter_path) as file:
+        assert file.read() == "x"
+
+
+def test_sqlite_cache_evicts_least_recently_used(tmp_path):
+    backend = cache.SQLiteCache(str(tmp_path / "cache.sqlite3"), max_bytes=200)
+    for i in range(50):
+        backend.set(f"key{i}", "value" * i)
+    conn = sqlite3.connect(backend.path)
+    count, total = conn.execute("SELECT COUNT(*), SUM(size) FROM entries").fetchone()
+    assert total <= 200 and count < 50
+    assert backend.get("key49") == "value" * 49
+
+
+def test_sqlite_cache_throttles_access_updates(tmp_path):
+    backend = cache.SQLiteCache(str(tmp_path / "cache.sqlite3"))
+    backend.set("key", "value")
+    conn = sqlite3.connect(backend.path)
+    accessed = conn.execute("SELECT accessed FROM entries").fetchone()[0]
+    backend.get("key")
+    assert conn.execute("SELECT accessed FROM entries").fetchone()[0] == accessed
+
+
+def test_memory_cache_lru_and_single_compute():
+    backend = cache.MemoryCache(max_bytes=100)
+    for i in range(20):
+        backend.set(str(i), i)
+    assert backend.get("0") is None and backend.get("19") == 19
+    assert backend.get_or_set("19", lambda: 0) == 19
+    assert backend.get_or_set("new", lambda: 5) == 5
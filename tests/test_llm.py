@@ -0,0 +1,133 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import llm
+
+
+@pytest.fixture(autouse=True)
+def executor(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=4)
+    monkeypatch.setattr(llm, "_executor", executor)
+    monkeypatch.setattr(llm, "_in_flight", 0)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def _fake_call(monkeypatch, behaviour):
+    """Replace the model call with behaviour(model_name, call_number); returns the recorded calls"""
+    calls = []
+    lock = threading.Lock()
+
+    def call(model_name, history, prompt, timeout):
+        with lock:
+            calls.append((model_name, time.monotonic()))
+            number = len(calls)
+        return behaviour(model_name, number)
+
+    monkeypatch.setattr(llm, "_call", call)
+    return calls
+
+
+def test_hedge_sent_after_delay_and_fastest_answer_wins(monkeypatch, executor):
+    def behaviour(model_name, number):
+        if number == 1:
+            time.sleep(0.5)
+            return "slow"
+        return "hedge"
+
+    calls = _fake_call(monkeypatch, behaviour)
+    start = time.monotonic()
+    assert llm._hedged_call("m", [], "prompt", timeout=2, hedge_after=0.1) == "hedge"
+    assert time.monotonic() - start < 0.4
+    assert len(calls) == 2
+    assert calls[1][1] - start >= 0.1
+
+    executor.shutdown(wait=True)
+    assert llm._in_flight == 0
+
+
+def test_no_hedge_when_first_call_is_fast(monkeypatch):
+    calls = _fake_call(monkeypatch, lambda model_name, number: "fast")
+    assert llm._hedged_call("m", [], "prompt", timeout=2, hedge_after=0.1) == "fast"
+    time.sleep(0.15)
+    assert len(calls) == 1
+
+
+def test_deadline_raises_timeout(monkeypatch):
+    _fake_call(monkeypatch, lambda model_name, number: time.sleep(0.5))
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        llm._hedged_call("m", [], "prompt", timeout=0.2, hedge_after=0)
+    assert time.monotonic() - start < 0.4
+
+
+def test_fast_failure_is_raised_without_waiting(monkeypatch):
+    def behaviour(model_name, number):
+        raise ValueError("boom")
+
+    calls = _fake_call(monkeypatch, behaviour)
+    start = time.monotonic()
+    with pytest.raises(ValueError, match="boom"):
+        llm._hedged_call("m", [], "prompt", timeout=5, hedge_after=1)
+    assert time.monotonic() - start < 0.5
+    assert len(calls) == 1
+
+
+def test_send_message_falls_back_in_order(monkeypatch):
+    def behaviour(model_name, number):
+        if model_name != "c":
+            raise RuntimeError(f"{model_name} down")
+        return "answer"
+
+    calls = _fake_call(monkeypatch, behaviour)
+    assert llm.send_message(["a", "b", "c"], [], "prompt", timeout=1, hedge_after=0) == "answer"
+    assert [model_name for model_name, _ in calls] == ["a", "b", "c"]
+
+
+def test_send_message_raises_when_every_model_fails(monkeypatch):
+    def behaviour(model_name, number):
+        raise RuntimeError(f"{model_name} down")
+
+    _fake_call(monkeypatch, behaviour)
+    with pytest.raises(llm.LLMError, match="a: a down; b: b down"):
+        llm.send_message(["a", "b"], [], "prompt", timeout=1, hedge_after=0)
+
+
+def test_queued_calls_are_cancelled_at_deadline(monkeypatch):
+    # A single worker: the hedge queues behind the first call and must never run
+    single = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(llm, "_executor", single)
+    calls = _fake_call(monkeypatch, lambda model_name, number: time.sleep(0.5))
+
+    with pytest.raises(TimeoutError):
+        llm._hedged_call("m", [], "prompt", timeout=0.2, hedge_after=0.05)
+    single.shutdown(wait=True)
+    assert len(calls) == 1
+    assert llm._in_flight == 0
+
+
+def test_no_hedge_when_pool_saturated(monkeypatch):
+    monkeypatch.setattr(llm, "LLM_MAX_WORKERS", 1)
+
+    def behaviour(model_name, number):
+        time.sleep(0.3)
+        return f"call {number}"
+
+    calls = _fake_call(monkeypatch, behaviour)
+    assert llm._hedged_call("m", [], "prompt", timeout=2, hedge_after=0.05) == "call 1"
+    assert len(calls) == 1
+
+
+def test_in_flight_tracks_running_calls(monkeypatch, executor):
+    release = threading.Event()
+    _fake_call(monkeypatch, lambda model_name, number: release.wait(1) and "done")
+
+    future = llm._submit("m", [], "prompt", 1)
+    assert llm._in_flight == 1
+    release.set()
+    assert future.result() == "done"
+    executor.shutdown(wait=True)
+    assert llm._in_flight == 0
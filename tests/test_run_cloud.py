@@ -0,0 +1,162 @@
+import os
+import stat
+import time
+import subprocess
+import threading
+
+import pytest
+
+import run_cloud
+
+TWO_COMPONENTS = '''
+provider "aws" {
+  region     = "us-east-1"
+  access_key = "AKIA1"
+}
+resource "aws_s3_bucket" "a" { bucket = "a" }
+resource "aws_s3_bucket" "b" { bucket = "b" }
+'''
+
+
+class FakeTerraform:
+    """Stands in for subprocess.run, recording terraform commands and leaving the files terraform would"""
+
+    def __init__(self):
+        self.commands = []
+        self.config_modes = []
+        self.fail_on = None
+        self._lock = threading.Lock()
+
+    def __call__(self, command, cwd, env, check):
+        subcommand = command[1]
+        with self._lock:
+            self.commands.append(command)
+            self.config_modes.append(stat.S_IMODE(os.stat(os.path.join(cwd, "main.tf")).st_mode))
+        if subcommand == self.fail_on:
+            raise subprocess.CalledProcessError(1, command)
+        if subcommand == "init":
+            os.makedirs(os.path.join(cwd, ".terraform"), exist_ok=True)
+        elif subcommand == "plan":
+            open(os.path.join(cwd, "tfplan"), "w").close()
+        elif subcommand == "apply":
+            open(os.path.join(cwd, "terraform.tfstate"), "w").close()
+
+    def subcommands(self):
+        return [command[1] for command in self.commands]
+
+
+@pytest.fixture
+def terraform(monkeypatch, tmp_path):
+    monkeypatch.setattr(run_cloud, "TERRAFORM_RUNS_DIR", str(tmp_path / "runs"))
+    monkeypatch.setattr(run_cloud, "TERRAFORM_WORKSPACES_DIR", str(tmp_path / "workspaces"))
+    monkeypatch.delenv("TF_PLUGIN_CACHE_DIR", raising=False)
+    fake = FakeTerraform()
+    monkeypatch.setattr(subprocess, "run", fake)
+    return fake
+
+
+def test_parallel_run_removes_credentials(terraform):
+    results = run_cloud.run_terraform_parallel(TWO_COMPONENTS)
+    assert [result["success"] for result in results] == [True, True]
+    assert sorted(terraform.subcommands()) == ["apply"] * 2 + ["init"] * 2 + ["plan"] * 2
+    assert set(terraform.config_modes) == {0o600}
+    for result in results:
+        assert sorted(os.listdir(result["directory"])) == [".terraform", "terraform.tfstate"]
+
+
+def test_parallel_run_removes_credentials_on_failure(terraform):
+    terraform.fail_on = "apply"
+    results = run_cloud.run_terraform_parallel(TWO_COMPONENTS)
+    assert [result["success"] for result in results] == [False, False]
+    for result in results:
+        assert not {"main.tf", "tfplan"} & set(os.listdir(result["directory"]))
+
+
+def test_old_run_directories_are_pruned(terraform):
+    runs_dir = run_cloud.TERRAFORM_RUNS_DIR
+    old_run, recent_run, plugin_cache = (os.path.join(runs_dir, name) for name in ("old", "recent", ".plugin-cache"))
+    for path in (old_run, recent_run, plugin_cache):
+        os.makedirs(path)
+    long_ago = time.time() - run_cloud.TERRAFORM_RUNS_RETENTION - 60
+    for path in (old_run, plugin_cache):
+        os.utime(path, (long_ago, long_ago))
+
+    run_cloud.run_terraform_parallel(TWO_COMPONENTS)
+    assert not os.path.exists(old_run)
+    assert os.path.isdir(recent_run) and os.path.isdir(plugin_cache)
+
+
+def _workspace_files(tenant_id):
+    return set(os.listdir(os.path.join(run_cloud.TERRAFORM_WORKSPACES_DIR, tenant_id)))
+
+
+def _last_applied(tenant_id):
+    with open(os.path.join(run_cloud.TERRAFORM_WORKSPACES_DIR, tenant_id, "last_applied.txt")) as file:
+        return file.read()
+
+
+def test_incremental_first_run_initializes_and_records_redacted_script(terraform):
+    result = run_cloud.run_terraform_incremental(TWO_COMPONENTS, "tenant")
+    assert terraform.subcommands() == ["init", "plan", "apply"]
+    assert not result["init_skipped"]
+    assert set(terraform.config_modes) == {0o600}
+    assert not {"main.tf", "tfplan"} & _workspace_files("tenant")
+    assert "AKIA1" not in _last_applied("tenant") and "sha256:" in _last_applied("tenant")
+
+
+def test_incremental_skips_unchanged_script(terraform):
+    run_cloud.run_terraform_incremental(TWO_COMPONENTS, "tenant")
+    result = run_cloud.run_terraform_incremental(TWO_COMPONENTS.replace("  region     =", "  region ="), "tenant")
+    assert result["skipped"]
+    assert terraform.subcommands() == ["init", "plan", "apply"]
+
+
+def test_incremental_targets_changed_resources_without_init(terraform):
+    run_cloud.run_terraform_incremental(TWO_COMPONENTS, "tenant")
+    terraform.commands.clear()
+
+    result = run_cloud.run_terraform_incremental(TWO_COMPONENTS.replace('bucket = "b"', 'bucket = "c"'), "tenant")
+    assert terraform.subcommands() == ["plan", "apply"]
+    assert result["init_skipped"] and result["targets"] == ["aws_s3_bucket.b"]
+    plan = terraform.commands[0]
+    assert [arg for arg in plan if arg.startswith("-target=")] == ["-target=aws_s3_bucket.b"]
+
+
+def test_incremental_runs_init_when_workspace_not_initialized(terraform):
+    run_cloud.run_terraform_incremental(TWO_COMPONENTS, "tenant")
+    os.rmdir(os.path.join(run_cloud.TERRAFORM_WORKSPACES_DIR, "tenant", ".terraform"))
+    terraform.commands.clear()
+
+    result = run_cloud.run_terraform_incremental(TWO_COMPONENTS.replace('bucket = "b"', 'bucket = "c"'), "tenant")
+    assert terraform.subcommands() == ["init", "plan", "apply"]
+    assert not result["init_skipped"]
+
+
+def test_incremental_failure_removes_credentials_and_keeps_last_applied(terraform):
+    run_cloud.run_terraform_incremental(TWO_COMPONENTS, "tenant")
+    applied = _last_applied("tenant")
+    changed = TWO_COMPONENTS.replace('bucket = "b"', 'bucket = "c"')
+
+    terraform.fail_on = "apply"
+    with pytest.raises(subprocess.CalledProcessError):
+        run_cloud.run_terraform_incremental(changed, "tenant")
+    assert not {"main.tf", "tfplan"} & _workspace_files("tenant")
+    assert _last_applied("tenant") == applied
+
+    # The failed change is planned again on the next submission
+    terraform.fail_on = None
+    terraform.commands.clear()
+    assert not run_cloud.run_terraform_incremental(changed, "tenant").get("skipped")
+    assert terraform.subcommands() == ["plan", "apply"]
+
+
+def test_incremental_failed_first_run_records_nothing(terraform):
+    terraform.fail_on = "plan"
+    with pytest.raises(subprocess.CalledProcessError):
+        run_cloud.run_terraform_incremental(TWO_COMPONENTS, "tenant")
+    assert "last_applied.txt" not in _workspace_files("tenant")
+
+
+def test_incremental_rejects_unsafe_tenant_ids(terraform):
+    with pytest.raises(ValueError):
+        run_cloud.run_terraform_incremental(TWO_COMPONENTS, "../other")
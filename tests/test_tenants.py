@@ -0,0 +1,20 @@
+import pytest
+
+import tenants
+
+
+def test_tenant_tokens_round_trip_and_reject_forgeries(monkeypatch):
+    monkeypatch.setattr(tenants, "TENANT_SECRET", "test-secret")
+    token = tenants.issue_tenant_token()
+    tenant_id = tenants.tenant_from_token(token)
+    assert token.startswith(f"{tenant_id}.")
+
+    for forged in ("someone-else", f"someone-else.{token.split('.')[1]}", "", None):
+        with pytest.raises(ValueError):
+            tenants.tenant_from_token(forged)
+
+
+def test_tenant_tokens_disabled_without_secret(monkeypatch):
+    monkeypatch.setattr(tenants, "TENANT_SECRET", "")
+    with pytest.raises(ValueError):
+        tenants.issue_tenant_token()
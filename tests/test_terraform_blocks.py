@@ -0,0 +1,240 @@
+import pytest
+
+from terraform_blocks import (
+    diff_scripts, merge_scripts, redact_secrets, split_blocks, split_independent_configs, strip_language_marker
+)
+
+
+def test_split_blocks_labels_and_addresses():
+    blocks = split_blocks('''
+provider "aws" { region = "us-east-1" }
+resource "aws_instance" "web" { ami = "ami-1" }
+data "aws_ami" "ubuntu" { most_recent = true }
+variable "env" {}
+''')
+    assert [block.kind for block in blocks] == ["provider", "resource", "data", "variable"]
+    assert [block.address for block in blocks[1:]] == ["aws_instance.web", "data.aws_ami.ubuntu", "var.env"]
+
+
+def test_split_blocks_ignores_braces_in_strings_comments_and_heredocs():
+    script = '''
+# a comment with { brace
+resource "aws_instance" "web" {
+  tags = { Name = "x}" }  // trailing } comment
+  /* block { comment */
+  user_data = <<-EOF
+    echo "}"
+  EOF
+}
+resource "aws_s3_bucket" "b" { bucket = "b" }
+'''
+    blocks = split_blocks(script)
+    assert [block.address for block in blocks] == ["aws_instance.web", "aws_s3_bucket.b"]
+    assert blocks[0].text.endswith("EOF\n}")
+
+
+def test_split_blocks_rejects_unbalanced_braces():
+    with pytest.raises(ValueError):
+        split_blocks('resource "aws_instance" "web" {\n  ami = "x"\n')
+
+
+def test_strip_language_marker():
+    assert strip_language_marker('hcl\nprovider "aws" {}') == 'provider "aws" {}'
+    assert strip_language_marker('provider "aws" {}') == 'provider "aws" {}'
+
+
+def test_merge_scripts_deduplicates_identical_providers():
+    fragment_a = 'provider "aws" { region = "us-east-1" }\nresource "aws_instance" "a" { ami = "x" }'
+    fragment_b = 'provider "aws" { region = "us-east-1" }\nresource "aws_s3_bucket" "b" { bucket = "b" }'
+    blocks = split_blocks(merge_scripts([fragment_a, fragment_b]))
+    assert [block.address for block in blocks] == ["provider.aws", "aws_instance.a", "aws_s3_bucket.b"]
+
+
+def test_merge_scripts_aliases_conflicting_providers():
+    east = 'provider "aws" { region = "us-east-1" }\nresource "aws_instance" "a" { ami = "x" }'
+    west = 'provider "aws" {\n  region = "us-west-2"\n}\nresource "aws_instance" "b" { ami = "y" }'
+    merged = split_blocks(merge_scripts([east, west]))
+    blocks = {block.address: block for block in merged}
+
+    assert "provider = " not in blocks["aws_instance.a"].text
+    assert "provider = aws.aws_2" in blocks["aws_instance.b"].text
+    providers = [block for block in merged if block.kind == "provider"]
+    assert len(providers) == 2
+    assert 'alias = "aws_2"' in providers[1].text and "us-west-2" in providers[1].text
+
+
+def test_merge_scripts_reuses_alias_for_same_conflicting_config():
+    east = 'provider "aws" { region = "us-east-1" }\nresource "aws_instance" "a" { ami = "x" }'
+    west_1 = 'provider "aws" { region = "us-west-2" }\nresource "aws_instance" "b" { ami = "y" }'
+    west_2 = 'provider "aws" { region = "us-west-2" }\nresource "aws_instance" "c" { ami = "z" }'
+    merged = merge_scripts([east, west_1, west_2])
+    assert merged.count('provider "aws"') == 2
+    assert merged.count("provider = aws.aws_2") == 2
+
+
+def test_merge_scripts_ignores_comments_when_comparing_providers():
+    a = 'provider "aws" {\n  region = "us-east-1" # default\n}\nresource "aws_instance" "a" { ami = "x" }'
+    b = 'provider "aws" {\n  // same region\n  region = "us-east-1"\n}\nresource "aws_instance" "b" { ami = "y" }'
+    merged = merge_scripts([a, b])
+    assert merged.count('provider "aws"') == 1
+    assert "aws_2" not in merged
+
+
+def test_merge_scripts_rejects_conflicting_aliased_providers():
+    a = 'provider "aws" {\n  alias = "west"\n  region = "us-west-1"\n}'
+    b = 'provider "aws" {\n  alias = "west"\n  region = "us-west-2"\n}'
+    with pytest.raises(ValueError):
+        merge_scripts([a, b])
+
+
+def test_merge_scripts_merges_required_providers():
+    aws = 'terraform {\n  required_providers {\n    aws = { source = "hashicorp/aws" }\n  }\n}\nresource "aws_instance" "a" { ami = "x" }'
+    google = 'terraform {\n  required_providers {\n    google = {\n      source = "hashicorp/google"\n    }\n  }\n}\nresource "google_storage_bucket" "g" { name = "g" }'
+    blocks = split_blocks(merge_scripts([aws, google]))
+    terraform_blocks = [block for block in blocks if block.kind == "terraform"]
+    assert len(terraform_blocks) == 1
+    assert "hashicorp/aws" in terraform_blocks[0].text
+    assert "hashicorp/google" in terraform_blocks[0].text
+
+
+def test_merge_scripts_rejects_conflicting_provider_sources():
+    a = 'terraform {\n  required_providers {\n    aws = { source = "hashicorp/aws" }\n  }\n}'
+    b = 'terraform {\n  required_providers {\n    aws = { source = "someone/aws" }\n  }\n}'
+    with pytest.raises(ValueError):
+        merge_scripts([a, b])
+
+
+def test_merge_scripts_rejects_conflicting_resources():
+    a = 'resource "aws_instance" "example" { ami = "x" }'
+    b = 'resource "aws_instance" "example" { ami = "y" }'
+    with pytest.raises(ValueError):
+        merge_scripts([a, b])
+
+
+def test_split_independent_configs_groups_by_references():
+    script = '''
+terraform { required_providers { aws = { source = "hashicorp/aws" } } }
+provider "aws" { region = "us-east-1" }
+provider "google" { project = "p" }
+variable "env" { default = "dev" }
+locals {
+  tags = { Env = var.env }
+}
+resource "aws_vpc" "main" { cidr_block = "10.0.0.0/16" }
+resource "aws_subnet" "a" {
+  vpc_id = aws_vpc.main.id
+  tags   = local.tags
+}
+data "aws_ami" "ubuntu" { most_recent = true }
+resource "aws_instance" "web" { ami = data.aws_ami.ubuntu.id }
+output "ip" { value = aws_instance.web.public_ip }
+resource "aws_s3_bucket" "b" { bucket = "b" }
+resource "google_storage_bucket" "g" { name = "g" }
+'''
+    configs = dict((tuple(sorted(addresses)), text) for addresses, text in split_independent_configs(script))
+    assert set(configs) == {
+        ("aws_subnet.a", "aws_vpc.main", "locals"),
+        ("aws_instance.web", "data.aws_ami.ubuntu", "output.ip"),
+        ("aws_s3_bucket.b",),
+        ("google_storage_bucket.g",),
+    }
+
+    bucket = configs[("aws_s3_bucket.b",)]
+    assert 'provider "aws"' in bucket and 'provider "google"' not in bucket
+    assert "terraform {" in bucket and 'variable "env"' in bucket
+    google = configs[("google_storage_bucket.g",)]
+    assert 'provider "google"' in google and 'provider "aws"' not in google
+
+
+def test_split_independent_configs_single_component():
+    script = 'resource "aws_vpc" "main" {}\nresource "aws_subnet" "a" { vpc_id = aws_vpc.main.id }'
+    assert [sorted(addresses) for addresses, _ in split_independent_configs(script)] == [["aws_subnet.a", "aws_vpc.main"]]
+
+
+def test_split_independent_configs_keeps_remote_state_together():
+    script = '''
+terraform {
+  backend "s3" {
+    bucket = "state"
+    key    = "app.tfstate"
+  }
+}
+resource "aws_s3_bucket" "a" { bucket = "a" }
+resource "aws_s3_bucket" "b" { bucket = "b" }
+'''
+    configs = split_independent_configs(script)
+    assert len(configs) == 1
+    assert sorted(configs[0][0]) == ["aws_s3_bucket.a", "aws_s3_bucket.b"]
+    assert configs[0][1].count('backend "s3"') == 1
+
+
+BASE = '''
+provider "aws" {
+  region     = "us-east-1"
+  access_key = "AKIA1"
+  secret_key = "secret1"
+}
+resource "aws_vpc" "main" { cidr_block = "10.0.0.0/16" }
+resource "aws_subnet" "a" { vpc_id = aws_vpc.main.id }
+resource "aws_s3_bucket" "b" { bucket = "b" }
+'''
+
+
+def test_diff_scripts_first_apply_needs_everything():
+    changes = diff_scripts("", BASE)
+    assert changes["init_required"] and changes["full_plan"] and not changes["unchanged"]
+
+
+def test_diff_scripts_unchanged_ignores_formatting():
+    assert diff_scripts(BASE, BASE.replace("  region     =", "  region ="))["unchanged"]
+
+
+def test_diff_scripts_targets_changed_resource_and_dependents():
+    changes = diff_scripts(BASE, BASE.replace("10.0.0.0/16", "10.1.0.0/16"))
+    assert changes["targets"] == ["aws_subnet.a", "aws_vpc.main"]
+    assert not changes["init_required"] and not changes["full_plan"]
+
+
+def test_diff_scripts_targets_removed_and_added_resources():
+    new = BASE.replace('resource "aws_s3_bucket" "b" { bucket = "b" }', 'resource "aws_s3_bucket" "c" { bucket = "c" }')
+    assert diff_scripts(BASE, new)["targets"] == ["aws_s3_bucket.b", "aws_s3_bucket.c"]
+
+
+def test_diff_scripts_provider_change_means_full_plan_without_init():
+    changes = diff_scripts(BASE, BASE.replace("us-east-1", "us-west-2"))
+    assert changes["full_plan"] and not changes["init_required"]
+
+
+def test_diff_scripts_new_provider_requires_init():
+    changes = diff_scripts(BASE, BASE + 'resource "google_storage_bucket" "g" { name = "g" }\n')
+    assert changes["init_required"] and changes["targets"] == ["google_storage_bucket.g"]
+
+
+def test_redact_secrets_hides_values_but_tracks_changes():
+    redacted = redact_secrets(BASE)
+    assert "AKIA1" not in redacted and "secret1" not in redacted
+    assert 'region     = "us-east-1"' in redacted
+    assert diff_scripts(redacted, redact_secrets(BASE))["unchanged"]
+    assert diff_scripts(redacted, redact_secrets(BASE.replace("secret1", "secret2")))["full_plan"]
+
+
+def test_redact_secrets_single_line_and_nested_blocks():
+    script = '''
+provider "aws" { access_key = "AKIAXYZ" }
+provider "cloudflare" {
+  api_token = "cf-token" # production
+  assume_role {
+    external_secret = "nested-secret"
+  }
+}
+provider "datadog" {
+  api_key = "dd-key"
+}
+resource "aws_instance" "web" { ami = "ami-1" }
+'''
+    redacted = redact_secrets(script)
+    for secret in ("AKIAXYZ", "cf-token", "nested-secret", "dd-key"):
+        assert secret not in redacted
+    assert 'resource "aws_instance" "web" { ami = "ami-1" }' in redacted
+    assert diff_scripts(redacted, redact_secrets(script.replace("# production", "")))["unchanged"]
+    assert diff_scripts(redacted, redact_secrets(script.replace("dd-key", "dd-key-2")))["full_plan"]